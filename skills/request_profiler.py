@@ -0,0 +1,183 @@
+import io
+import hmac
+import os
+import sys
+import time
+import uuid
+import marshal
+import pstats
+import cProfile
+import threading
+from collections import Counter, deque
+from typing import Optional, Dict, Any, List
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+    def __init__(self, target_thread_id: int, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+PROFILE_FORMATS = ("pstats", "collapsed", "raw")
+PSTATS_SORT_KEYS = tuple(sorted(pstats.Stats.sort_arg_dict_default))
+
+class ProfileCapture:
+    """
+    Profiles everything running on the calling thread between start() and stop().
+    On the event-loop thread that includes any other coroutine the loop runs in
+    the meantime, so a capture can contain work from concurrent requests.
+    """
+    def __init__(self, path: str, method: str, sample_interval: float = 0.005):
+        self.profile_id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.method = method
+        self.sample_interval = sample_interval
+        self.started_at = 0.0
+        self.duration_ms = 0.0
+        self._profiler = cProfile.Profile()
+        self._sampler: Optional[_StackSampler] = None
+        self.stats: Dict[Any, Any] = {}
+        self.samples: Counter = Counter()
+
+    def start(self):
+        """Raises if the profiler hook is unavailable (e.g. held by coverage or a debugger on 3.12+)."""
+        self.started_at = time.time()
+        self._profiler.enable()
+        try:
+            self._sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+            self._sampler.start()
+        except Exception:
+            self._profiler.disable()
+            self._sampler = None
+            raise
+
+    def stop(self):
+        self._profiler.disable()
+        self._sampler.stop()
+        self.duration_ms = (time.time() - self.started_at) * 1000
+        self._profiler.create_stats()
+        self.stats = self._profiler.stats
+        self.samples = self._sampler.samples
+        self._profiler = None
+        self._sampler = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 2),
+            "samples": sum(self.samples.values())
+        }
+
+    def _as_pstats(self, stream) -> pstats.Stats:
+        stats = pstats.Stats(stream=stream)
+        stats.stats = self.stats
+        stats.get_top_level_stats()
+        return stats
+
+    def render_pstats(self, sort_by: str = "cumulative", limit: int = 60) -> str:
+        stream = io.StringIO()
+        self._as_pstats(stream).sort_stats(sort_by).print_stats(limit)
+        return stream.getvalue()
+
+    def render_collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack format, ready for flamegraph.pl or speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def dump_raw(self) -> bytes:
+        """Same bytes as Profile.dump_stats(), loadable with pstats or snakeviz."""
+        return marshal.dumps(self.stats)
+
+class RequestProfiler:
+    """
+    Keeps the last N request profiles in a ring buffer.
+    A request is profiled when it carries the profile header together with a
+    valid admin token, or when the admin toggle is on and its path is one of the
+    watched paths. Only one capture runs
+    at a time: a thread holds a single cProfile hook, so overlapping captures
+    would clobber each other (3.11) or raise ValueError (3.12+).
+    """
+    HEADER = "x-litetutor-profile"
+
+    def __init__(self, admin_token: str, capacity: int = 20, watched_paths=("/search", "/tutor")):
+        self.admin_token = admin_token
+        self.capacity = max(1, capacity)
+        self.watched_paths = set(watched_paths)
+        self.always_on = False
+        self._profiles: "deque[ProfileCapture]" = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self._capture_lock = threading.Lock()
+
+    def try_begin_capture(self) -> bool:
+        """Claims the single capture slot without blocking; False if one is already running."""
+        return self._capture_lock.acquire(blocking=False)
+
+    def end_capture(self):
+        self._capture_lock.release()
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        if not self.admin_token or not token:
+            return False
+        return hmac.compare_digest(token.encode("utf-8"), self.admin_token.encode("utf-8"))
+
+    def should_profile(self, path: str, header_value: Optional[str], admin_token: Optional[str]) -> bool:
+        if header_value is not None and header_value.strip().lower() in {"1", "true", "yes", "on"}:
+            return self.is_admin(admin_token)
+        return self.always_on and path in self.watched_paths
+
+    def record(self, capture: ProfileCapture):
+        with self._lock:
+            self._profiles.append(capture)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [p.summary() for p in reversed(self._profiles)]
+
+    def get(self, profile_id: str) -> Optional[ProfileCapture]:
+        with self._lock:
+            for capture in self._profiles:
+                if capture.profile_id == profile_id:
+                    return capture
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+def profiler_from_env() -> Optional[RequestProfiler]:
+    """
+    Builds the profiler if LITETUTOR_PROFILING opts in, otherwise returns None.
+    Refuses to start without LITETUTOR_ADMIN_TOKEN, since the node is publicly tunnelled.
+    """
+    mode = os.getenv("LITETUTOR_PROFILING", "0").strip().lower()
+    if mode not in {"1", "true", "yes", "on"}:
+        return None
+    admin_token = os.getenv("LITETUTOR_ADMIN_TOKEN", "").strip()
+    if not admin_token:
+        print("[WARN] LITETUTOR_PROFILING is on but LITETUTOR_ADMIN_TOKEN is unset; profiling stays disabled.")
+        return None
+    try:
+        capacity = int(os.getenv("LITETUTOR_PROFILE_BUFFER", "20"))
+    except ValueError:
+        capacity = 20
+    return RequestProfiler(admin_token=admin_token, capacity=capacity)
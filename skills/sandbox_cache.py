@@ -0,0 +1,264 @@
+import os
+import atexit
+import ast
+import json
+import hashlib
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+# Modules whose output can change between two runs of byte-identical code.
+# Matched against every part of a dotted name, so numpy.random and sympy.stats count too.
+NONDETERMINISTIC_MODULES = {
+    "random", "secrets", "uuid", "time", "datetime", "os", "platform",
+    "socket", "urllib", "http", "requests", "subprocess", "threading",
+    "multiprocessing", "asyncio", "tempfile", "glob", "pathlib", "shutil",
+    "getpass", "builtins", "sqlite3", "importlib", "io", "sys", "stats",
+}
+NONDETERMINISTIC_NAMES = {
+    "random", "input", "open", "id", "hash", "__import__", "exec", "eval",
+    "getattr", "globals", "vars",
+    # sympy.stats / numpy.random sampling helpers
+    "sample", "sample_iter", "sample_stochastic_process", "default_rng", "shuffle",
+}
+
+# Regression table for is_deterministic(), checked by the local test block below.
+DETERMINISM_CASES = [
+    ("from sympy import symbols, solve\nx = symbols('x')\nprint(solve(x**2 - 4, x))", True),
+    ("import numpy as np\nprint(np.linalg.det(np.eye(3)))", True),
+    ("from sympy.combinatorics import Permutation\nprint(Permutation([1, 0, 2]))", True),
+    ("import random\nprint(random.random())", False),
+    ("import numpy as np\nprint(np.random.rand())", False),
+    ("from numpy.random import rand\nprint(rand())", False),
+    ("import numpy.random as r\nprint(r.rand())", False),
+    ("import sympy.core.random as r", False),
+    ("from sympy import randprime\nprint(randprime(1, 100))", False),
+    ("from sympy import randMatrix\nprint(randMatrix(2))", False),
+    ("from sympy.polys.specialpolys import random_poly", False),
+    ("from sympy.stats import Normal, sample\nprint(sample(Normal('X', 0, 1)))", False),
+    ("from sympy import stats", False),
+    ("import importlib\nimportlib.import_module('random')", False),
+    ("import io\nio.FileIO('x')", False),
+]
+
+def _is_flagged_name(name: str) -> bool:
+    # rand, randn, randint, randprime, randMatrix, random_poly, ...
+    return name in NONDETERMINISTIC_NAMES or name.startswith("rand") or "random" in name.lower()
+
+def _is_flagged_module(dotted: str) -> bool:
+    return any(part in NONDETERMINISTIC_MODULES or _is_flagged_name(part) for part in dotted.split("."))
+
+_FINGERPRINT_PROBE = (
+    "import sys, importlib.metadata as m\n"
+    "print(sys.version)\n"
+    "for name in ('sympy', 'numpy', 'mpmath'):\n"
+    "    try:\n"
+    "        print(name, m.version(name))\n"
+    "    except Exception:\n"
+    "        print(name, '-')\n"
+)
+
+def is_deterministic(code: str) -> bool:
+    """Returns False if the code imports or touches anything flagged as non-deterministic."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            if any(_is_flagged_module(alias.name) for alias in node.names):
+                return False
+        elif isinstance(node, ast.ImportFrom):
+            if node.level or _is_flagged_module(node.module or ""):
+                return False
+            # `from sympy import stats` imports a module just like `import sympy.stats`
+            if any(_is_flagged_module(alias.name) for alias in node.names):
+                return False
+        elif isinstance(node, ast.Name) and _is_flagged_name(node.id):
+            return False
+        elif isinstance(node, ast.Attribute) and _is_flagged_name(node.attr):
+            # e.g. numpy.random reached via attribute access
+            return False
+    return True
+
+def _interpreter_fingerprint(interpreter: str = "python") -> str:
+    resolved = shutil.which(interpreter) or interpreter
+    parts = [os.path.realpath(resolved)]
+    try:
+        st = os.stat(resolved)
+        parts.append(f"{st.st_size}:{int(st.st_mtime)}")
+    except OSError:
+        pass
+    try:
+        probe = subprocess.run(
+            [interpreter, "-c", _FINGERPRINT_PROBE],
+            capture_output=True,
+            text=True,
+            timeout=20
+        )
+        parts.append(probe.stdout)
+    except Exception:
+        parts.append("probe-failed")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+class SandboxResultCache:
+    """
+    Size-bounded LRU cache of successful /solve runs, persisted as JSON on disk.
+    Entries are keyed by (code hash, language, interpreter fingerprint), so an
+    interpreter or library upgrade invalidates everything cached before it.
+    Runs whose output exceeds max_entry_bytes are never cached, which caps the
+    cache at roughly max_entries * max_entry_bytes. Disk writes are batched on a
+    background timer instead of happening on every put().
+    Each entry remembers how long the original run took, and a hit is only
+    served if that duration fits within the caller's timeout.
+    """
+    def __init__(self, cache_path: str = "./sandbox_cache.json", max_entries: int = 256, interpreter: str = "python",
+                 fingerprint: Optional[str] = None, max_entry_bytes: int = 64 * 1024, flush_delay: float = 5.0):
+        self.cache_path = cache_path
+        self.max_entries = max(1, max_entries)
+        self.max_entry_bytes = max(0, max_entry_bytes)
+        self.flush_delay = max(0.0, flush_delay)
+        self.interpreter = interpreter
+        # Probing the interpreter spawns a subprocess, so it must never happen inside a request.
+        self.fingerprint = fingerprint or _interpreter_fingerprint(interpreter)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        self._load()
+
+    def make_key(self, code: str, language: str) -> str:
+        code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{code_hash}|{language.lower()}|{self.fingerprint}".encode("utf-8")).hexdigest()
+
+    def get(self, code: str, language: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        if not is_deterministic(code):
+            return None
+        key = self.make_key(code, language)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if timeout is not None and entry["duration"] > timeout:
+                # The original run would have timed out under this request's budget.
+                return None
+            self._entries.move_to_end(key)
+            return dict(entry["result"])
+
+    def put(self, code: str, language: str, result: Dict[str, Any], duration: float) -> bool:
+        """Stores a run result and its wall time; only successful runs of deterministic code are kept."""
+        if result.get("status") != "success" or result.get("exit_code") != 0:
+            return False
+        output_bytes = len(str(result.get("stdout") or "").encode("utf-8")) + len(str(result.get("stderr") or "").encode("utf-8"))
+        if output_bytes > self.max_entry_bytes:
+            return False
+        if not is_deterministic(code):
+            return False
+        key = self.make_key(code, language)
+        with self._lock:
+            self._entries[key] = {"result": dict(result), "duration": float(duration)}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+        self.flush()
+
+    def flush(self):
+        """Writes pending changes to disk; called by the background timer and at exit."""
+        # Snapshot and write under the same save lock, so overlapping flushes
+        # (timer vs. atexit) can never land an older snapshot after a newer one.
+        with self._save_lock:
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                if not self._dirty:
+                    return
+                snapshot = list(self._entries.items())
+                self._dirty = False
+            if not self._save(snapshot):
+                with self._lock:
+                    self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Ignoring unreadable sandbox cache {self.cache_path}: {e}")
+            return
+        entries = data.get("entries") if isinstance(data, dict) else None
+        if not isinstance(entries, list) or not all(
+            isinstance(item, list) and len(item) == 2 and isinstance(item[0], str) and isinstance(item[1], dict)
+            and isinstance(item[1].get("result"), dict) and isinstance(item[1].get("duration"), (int, float))
+            for item in entries
+        ):
+            print(f"[WARN] Ignoring unreadable sandbox cache {self.cache_path}: unexpected structure")
+            return
+        for key, entry in entries[-self.max_entries:]:
+            self._entries[key] = entry
+        print(f"[SYSTEM] Loaded {len(self._entries)} cached sandbox results.")
+
+    def _save(self, snapshot) -> bool:
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": snapshot}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+            return True
+        except OSError as e:
+            print(f"[WARN] Failed to persist sandbox cache: {e}")
+            return False
+
+def cache_from_env() -> Optional[SandboxResultCache]:
+    """Builds the cache if LITETUTOR_SANDBOX_CACHE opts in, otherwise returns None."""
+    mode = os.getenv("LITETUTOR_SANDBOX_CACHE", "0").strip().lower()
+    if mode not in {"1", "true", "yes", "on"}:
+        return None
+    cache_path = os.getenv("LITETUTOR_SANDBOX_CACHE_PATH", "./sandbox_cache.json").strip()
+    try:
+        max_entries = int(os.getenv("LITETUTOR_SANDBOX_CACHE_SIZE", "256"))
+    except ValueError:
+        max_entries = 256
+    try:
+        max_entry_bytes = int(os.getenv("LITETUTOR_SANDBOX_CACHE_MAX_BYTES", str(64 * 1024)))
+    except ValueError:
+        max_entry_bytes = 64 * 1024
+    print("[SYSTEM] Fingerprinting sandbox interpreter for result cache...")
+    fingerprint = _interpreter_fingerprint("python")
+    cache = SandboxResultCache(
+        cache_path=cache_path,
+        max_entries=max_entries,
+        fingerprint=fingerprint,
+        max_entry_bytes=max_entry_bytes
+    )
+    atexit.register(cache.flush)
+    return cache
+
+# Quick Local Test Block
+if __name__ == "__main__":
+    failures = 0
+    for code, expected in DETERMINISM_CASES:
+        actual = is_deterministic(code)
+        status = "OK  " if actual == expected else "FAIL"
+        failures += actual != expected
+        print(f"[{status}] expected={expected!s:<5} {code.splitlines()[0]}")
+    print(f"\n{len(DETERMINISM_CASES) - failures}/{len(DETERMINISM_CASES)} determinism cases passed.")
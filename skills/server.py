@@ -1,16 +1,19 @@
 import os
 import subprocess
+import time
 import re
 import uuid
 from collections import Counter
 from typing import Optional, Dict, Any, List
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Header, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 import uvicorn
 
 from rag_builder import LocalRAGKnowledgeBase
 from edge_tool import get_tool_schemas
+from sandbox_cache import cache_from_env
+from request_profiler import ProfileCapture, PROFILE_FORMATS, PSTATS_SORT_KEYS, profiler_from_env
 
 class UTF8JSONResponse(JSONResponse):
     media_type = "application/json; charset=utf-8"
@@ -31,6 +34,8 @@ tutor_sessions: Dict[str, Dict[str, Any]] = {}
 
 print("Waking up Right Brain (ChromaDB)...")
 rag_db = LocalRAGKnowledgeBase()
+sandbox_cache = cache_from_env()
+request_profiler = profiler_from_env()
 
 class TaskRequest(BaseModel):
     task_instruction: Optional[str] = None
@@ -43,19 +48,30 @@ async def receive_task(request: TaskRequest):
     if request.code and request.code.strip():
         if request.language.lower() != "python":
             return {"status": "error", "message": "Only python is supported for code execution."}
+        if sandbox_cache is not None:
+            cached = sandbox_cache.get(request.code, request.language, timeout=request.timeout)
+            if cached is not None:
+                print("[SOLVE] Served from sandbox result cache.")
+                cached["cached"] = True
+                return cached
         try:
+            started = time.monotonic()
             result = subprocess.run(
                 ["python", "-c", request.code],
                 capture_output=True,
                 text=True,
                 timeout=request.timeout
             )
-            return {
+            duration = time.monotonic() - started
+            response = {
                 "status": "success" if result.returncode == 0 else "failed",
                 "stdout": result.stdout,
                 "stderr": result.stderr,
                 "exit_code": result.returncode
             }
+            if sandbox_cache is not None:
+                sandbox_cache.put(request.code, request.language, response, duration)
+            return response
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
@@ -170,5 +186,97 @@ async def tutor_fsm(req: TutorRequest):
     response = "本轮已完成。如需继续，请提交新问题。"
     return {"status": "success", "session_id": session_id, "stage": "complete", "response": response}
 
+# Profiling routes and middleware are only registered when LITETUTOR_PROFILING is on,
+# so a disabled node pays nothing per request.
+if request_profiler is not None:
+    print(f"[SYSTEM] Request profiling enabled (buffer: {request_profiler.capacity}).")
+
+    def _admin_error(status_code: int, message: str) -> UTF8JSONResponse:
+        return UTF8JSONResponse(status_code=status_code, content={"status": "error", "message": message})
+
+    def _check_admin(token: Optional[str]) -> Optional[UTF8JSONResponse]:
+        if not request_profiler.is_admin(token):
+            return _admin_error(403, "Invalid admin token.")
+        return None
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if not request_profiler.should_profile(
+            request.url.path,
+            request.headers.get(request_profiler.HEADER),
+            request.headers.get("x-admin-token")
+        ):
+            return await call_next(request)
+        if not request_profiler.try_begin_capture():
+            # Another request is already being profiled; serve this one unprofiled.
+            return await call_next(request)
+        try:
+            capture = ProfileCapture(request.url.path, request.method)
+            try:
+                capture.start()
+            except Exception as e:
+                print(f"[WARN] Could not start profiler, serving {request.url.path} unprofiled: {e}")
+                return await call_next(request)
+            try:
+                response = await call_next(request)
+            finally:
+                capture.stop()
+                request_profiler.record(capture)
+        finally:
+            request_profiler.end_capture()
+        print(f"[PROFILE] {capture.method} {capture.path} took {capture.duration_ms:.1f} ms -> {capture.profile_id}")
+        response.headers["X-LiteTutor-Profile-Id"] = capture.profile_id
+        return response
+
+    class ProfilingToggle(BaseModel):
+        enabled: bool
+
+    @app.post("/admin/profiling")
+    async def toggle_profiling(req: ProfilingToggle, x_admin_token: Optional[str] = Header(None)):
+        denied = _check_admin(x_admin_token)
+        if denied:
+            return denied
+        request_profiler.always_on = req.enabled
+        return {"status": "success", "enabled": request_profiler.always_on, "watched_paths": sorted(request_profiler.watched_paths)}
+
+    @app.get("/admin/profiles")
+    async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+        denied = _check_admin(x_admin_token)
+        if denied:
+            return denied
+        return {"status": "success", "enabled": request_profiler.always_on, "profiles": request_profiler.list_profiles()}
+
+    @app.get("/admin/profiles/{profile_id}")
+    async def get_profile(profile_id: str, output_format: str = Query("pstats", alias="format"),
+                          sort: str = "cumulative", limit: int = 60, x_admin_token: Optional[str] = Header(None)):
+        denied = _check_admin(x_admin_token)
+        if denied:
+            return denied
+        if output_format not in PROFILE_FORMATS:
+            return _admin_error(400, f"Unknown format '{output_format}'. Use one of: {', '.join(PROFILE_FORMATS)}.")
+        if sort not in PSTATS_SORT_KEYS:
+            return _admin_error(400, f"Unknown sort '{sort}'. Use one of: {', '.join(PSTATS_SORT_KEYS)}.")
+        limit = max(1, limit)
+        capture = request_profiler.get(profile_id)
+        if capture is None:
+            return _admin_error(404, f"Profile {profile_id} not found.")
+        if output_format == "collapsed":
+            return PlainTextResponse(capture.render_collapsed())
+        if output_format == "raw":
+            return Response(
+                content=capture.dump_raw(),
+                media_type="application/octet-stream",
+                headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'}
+            )
+        return PlainTextResponse(capture.render_pstats(sort_by=sort, limit=limit))
+
+    @app.delete("/admin/profiles")
+    async def clear_profiles(x_admin_token: Optional[str] = Header(None)):
+        denied = _check_admin(x_admin_token)
+        if denied:
+            return denied
+        request_profiler.clear()
+        return {"status": "success"}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)